@@ -1,13 +1,60 @@
 # app.py — Database Controller (Flask + SQLAlchemy)
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, event, select, insert
+from sqlalchemy.pool import NullPool
 import os
 from datetime import datetime
 import logging
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from queue import Queue, Empty, Full
+import atexit
 import json
+import re
+import mmap
+import orjson
+import cachetools
+
+# orjson só trabalha com inteiros de até 64 bits: acima disso vira float na leitura
+# e dá erro na escrita. Nesses casos (raros) cai para o json da stdlib, que é exato.
+# 19+ dígitos cobre tudo que pode não caber em i64/u64 (ex.: -9999999999999999999);
+# um match dentro de string (ex.: filename numérico longo) só usa o parser mais lento.
+_BIG_INT_RE = re.compile(rb"\d{19,}")
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _json_loads(data):
+    if isinstance(data, str):
+        data = data.encode()
+    if _BIG_INT_RE.search(data):
+        return json.loads(data)
+    return orjson.loads(data)
+
+def _json_dumps(obj, option=0):
+    try:
+        return orjson.dumps(obj, option=option)
+    except TypeError:
+        raw = json.dumps(obj, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode()
+        return raw + b"\n" if option & orjson.OPT_APPEND_NEWLINE else raw
+
+class OrjsonProvider(JSONProvider):
+    # jsonify/get_json via orjson (C) em vez do json da stdlib; trabalha direto em bytes
+    def dumps(self, obj, **kwargs):
+        return _json_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return _json_loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_json_dumps(obj), mimetype="application/json")
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # -----------------------
 # CONFIG
@@ -17,6 +64,26 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data.db")
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Pool de conexões: SQLite serializa no driver, então sem pool (NullPool);
+# Postgres com pre-ping contra conexões mortas e pool dividido entre os workers do
+# gunicorn: WEB_CONCURRENCY processos × (pool + overflow) <= DB_MAX_CONNECTIONS,
+# abaixo do max_connections=100 padrão do Postgres
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 4))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 80))
+_db_conns_per_worker = max(2, DB_MAX_CONNECTIONS // max(1, WEB_CONCURRENCY))
+if DATABASE_URL.startswith("sqlite"):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "poolclass": NullPool,
+        "connect_args": {"check_same_thread": False},
+    }
+else:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "pool_size": int(os.getenv("DB_POOL", _db_conns_per_worker // 2)),
+        "max_overflow": int(os.getenv("DB_OVERFLOW", _db_conns_per_worker - _db_conns_per_worker // 2)),
+    }
+
 db = SQLAlchemy(app)
 
 # Tokens
@@ -26,15 +93,23 @@ WORKER_TOKEN = os.getenv("WORKER_TOKEN", "worker123") # workers
 # Logging
 os.makedirs("logs", exist_ok=True)
 log_path = os.path.join("logs", "app.log")
-logging.basicConfig(
-    filename=log_path,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+# Handlers só enfileiram; a escrita em disco fica numa thread do QueueListener
+# Vários workers do gunicorn escrevem no mesmo arquivo: nada de rotação em processo
+# (um renomearia o arquivo dos outros); WatchedFileHandler reabre após logrotate externo
+_log_file_handler = WatchedFileHandler(log_path, encoding="utf-8")
+_log_file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+_log_queue = Queue(-1)
+_log_listener = QueueListener(_log_queue, _log_file_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(QueueHandler(_log_queue))
 
 def log_message(msg):
     app.logger.info(msg)
-    # também grava no arquivo via logging.basicConfig
+    # também grava no arquivo via QueueListener
 
 # -----------------------
 # MODELS
@@ -53,11 +128,15 @@ class Video(db.Model):
             "url": self.url,
             "title": self.title,
             "filename": self.filename,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at,  # datetime: orjson serializa em ISO 8601
         }
 
 class Job(db.Model):
     __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_queue_status_created", "queue", "status", "created_at"),  # claim + list por fila
+        db.Index("ix_jobs_owner_status", "owner", "status"),
+    )
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     queue = db.Column(db.String(128), nullable=False, default="solicitacao")
     owner = db.Column(db.String(256), nullable=True)
@@ -83,24 +162,149 @@ class Job(db.Model):
             "attempts": self.attempts,
             "max_retries": self.max_retries,
             "worker_id": self.worker_id,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "created_at": self.created_at,  # datetime: orjson serializa em ISO 8601
+            "updated_at": self.updated_at,
         }
 
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: leitores não bloqueiam o escritor; NORMAL: metade dos fsyncs por commit
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
 # Create tables automatically
 with app.app_context():
+    if db.engine.dialect.name == "sqlite":
+        event.listen(db.engine, "connect", _sqlite_pragmas)
     db.create_all()
 
+# -----------------------
+# JOB CACHE
+# -----------------------
+# Workers fazem polling em GET /jobs/<id>: guarda o JSON pronto por alguns segundos
+import threading
+import time
+
+JOB_CACHE = cachetools.TTLCache(maxsize=10_000, ttl=2.0)
+_job_cache_lock = threading.Lock()
+
+def _invalidate_job(job_id):
+    with _job_cache_lock:
+        JOB_CACHE.pop(job_id, None)
+
+# -----------------------
+# PROGRESS WRITE-BEHIND
+# -----------------------
+# Pings de progresso não são críticos: enfileira e grava em lote numa thread
+PROGRESS_FLUSH_ROWS = int(os.getenv("PROGRESS_FLUSH_ROWS", 500))
+PROGRESS_FLUSH_MS = int(os.getenv("PROGRESS_FLUSH_MS", 50))
+PROGRESS_QUEUE_MAX = int(os.getenv("PROGRESS_QUEUE_MAX", 10_000))
+PROGRESS_FLUSH_RETRIES = 5
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# Fila limitada: se o banco cair, o endpoint devolve 503 em vez de crescer sem fim
+_progress_queue = Queue(maxsize=PROGRESS_QUEUE_MAX)
+
+# A trava de status fica no WHERE: um complete/fail que commitar entre a leitura
+# e o UPDATE não é sobrescrito
+STMT_PROGRESS = text("""
+    UPDATE jobs SET progress = COALESCE(:progress, progress), updated_at = :now
+    WHERE id = :jid AND status NOT IN ('completed', 'failed', 'cancelled')
+""")
+
+STMT_PROGRESS_LOGS = text("""
+    UPDATE jobs SET progress = COALESCE(:progress, progress), result = :result, updated_at = :now
+    WHERE id = :jid AND status NOT IN ('completed', 'failed', 'cancelled')
+""").bindparams(bindparam("result", type_=db.JSON))
+
+def _drain_progress():
+    # bloqueia até o primeiro item, depois junta até N itens ou M ms
+    batch = [_progress_queue.get()]
+    deadline = time.monotonic() + PROGRESS_FLUSH_MS / 1000.0
+    while len(batch) < PROGRESS_FLUSH_ROWS:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_progress_queue.get(timeout=remaining))
+        except Empty:
+            break
+    return batch
+
+def _flush_progress(batch):
+    # agrupa por job: último progresso vence, mensagens mantêm a ordem
+    merged = {}
+    for job_id, progress, message, ts in batch:
+        entry = merged.setdefault(job_id, {"progress": None, "logs": [], "ts": ts})
+        if progress is not None:
+            entry["progress"] = progress
+        if message:
+            entry["logs"].append({"ts": ts.isoformat(), "msg": message})
+        entry["ts"] = ts
+    with app.app_context():
+        # só jobs com mensagens precisam do result atual para anexar os logs;
+        # FOR UPDATE trava essas linhas até o commit, para que flushes de outros workers
+        # do gunicorn não leiam o mesmo result e percam mensagens (no SQLite é no-op).
+        # ORDER BY id mantém a ordem das travas e evita deadlock entre lotes.
+        with_logs = sorted(job_id for job_id, entry in merged.items() if entry["logs"])
+        results = {}
+        if with_logs:
+            rows = db.session.execute(
+                select(Job.id, Job.result).where(Job.id.in_(with_logs)).order_by(Job.id).with_for_update()
+            )
+            results = {job_id: result for job_id, result in rows}
+        for job_id, entry in merged.items():
+            params = {"progress": entry["progress"], "now": entry["ts"], "jid": job_id}
+            if entry["logs"]:
+                if job_id not in results:
+                    continue
+                existing = dict(results[job_id] or {})
+                existing["logs"] = list(existing.get("logs", [])) + entry["logs"]
+                params["result"] = existing
+                db.session.execute(STMT_PROGRESS_LOGS, params)
+            else:
+                db.session.execute(STMT_PROGRESS, params)
+        db.session.commit()
+    for job_id in merged:
+        _invalidate_job(job_id)
+
+def _progress_writer():
+    while True:
+        batch = _drain_progress()
+        for attempt in range(1, PROGRESS_FLUSH_RETRIES + 1):
+            try:
+                _flush_progress(batch)
+                break
+            except Exception as e:
+                app.logger.error(f"[JOB] progress flush failed ({len(batch)} updates, attempt {attempt}): {e}")
+                # backoff exponencial; enquanto isso a fila enche e o endpoint passa a devolver 503
+                time.sleep(min(2 ** attempt * 0.1, 5.0))
+        else:
+            app.logger.error(f"[JOB] progress batch dropped after {PROGRESS_FLUSH_RETRIES} attempts ({len(batch)} updates)")
+
+threading.Thread(target=_progress_writer, name="progress-writer", daemon=True).start()
+
 # -----------------------
 # AUTH DECORATORS
 # -----------------------
 from functools import wraps
+import hmac
+
+# Header esperado pré-calculado uma vez (bytes), comparado em tempo constante
+_EXPECTED_FRONTEND = f"Bearer {AUTH_TOKEN}".encode()
+_EXPECTED_WORKER = f"Bearer {WORKER_TOKEN}".encode()
+
+def _token_matches(expected):
+    token = request.headers.get("Authorization", "").encode()
+    return hmac.compare_digest(token, expected)
 
 def require_auth_frontend(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        token = request.headers.get("Authorization", "")
-        if token != f"Bearer {AUTH_TOKEN}":
+        if not _token_matches(_EXPECTED_FRONTEND):
             return jsonify({"error": "unauthorized"}), 401
         return f(*args, **kwargs)
     return wrapper
@@ -108,12 +312,41 @@ def require_auth_frontend(f):
 def require_auth_worker(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        token = request.headers.get("Authorization", "")
-        if token != f"Bearer {WORKER_TOKEN}":
+        if not _token_matches(_EXPECTED_WORKER):
             return jsonify({"error": "worker unauthorized"}), 401
         return f(*args, **kwargs)
     return wrapper
 
+# -----------------------
+# LIST HELPERS
+# -----------------------
+MAX_PAGE_LIMIT = 1000
+STREAM_CHUNK_ROWS = 100
+STREAM_EXPORT_ROWS = 500
+
+def _paginate(stmt, id_col, default_limit=None):
+    # keyset: ?cursor=<id do último item recebido>&limit=<n>, mais novos primeiro
+    cursor = request.args.get("cursor", type=int)
+    limit = request.args.get("limit", default_limit, type=int)
+    if cursor:
+        stmt = stmt.where(id_col < cursor)
+    if limit is not None:
+        # limit <= 0 não pode virar "sem limite" (SQLite) nem erro no meio do stream (Postgres)
+        stmt = stmt.limit(max(1, min(limit, MAX_PAGE_LIMIT)))
+    return stmt.order_by(id_col.desc())
+
+def _stream_json_array(stmt):
+    # serializa direto das linhas (Core + orjson), sem objetos ORM nem lista intermediária
+    def generate():
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_CHUNK_ROWS)).mappings()
+        sep = b"["
+        for rows in result.partitions():
+            # uma chamada do encoder por bloco; [1:-1] tira os colchetes do array do bloco
+            yield sep + _json_dumps([dict(r) for r in rows])[1:-1]
+            sep = b","
+        yield b"]" if sep == b"," else b"[]"
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
 # -----------------------
 # ROUTES
 # -----------------------
@@ -124,7 +357,10 @@ def home():
         "message": "Database Controller online.",
         "endpoints": [
             "/videos (GET, POST, DELETE)",
+            "/data (GET, POST, DELETE) [alias de /videos]",
             "/jobs (POST, GET list)",
+            "/jobs/bulk (POST)",
+            "/jobs/stream (GET, NDJSON)",
             "/jobs/<id> (GET)",
             "/jobs/claim (POST) [worker]",
             "/jobs/<id>/progress (POST) [worker]",
@@ -141,13 +377,13 @@ def home():
 @app.route("/videos", methods=["GET"])
 @require_auth_frontend
 def list_videos():
-    vids = Video.query.order_by(Video.created_at.desc()).all()
-    return jsonify([v.to_dict() for v in vids])
+    stmt = _paginate(select(Video.__table__), Video.id)
+    return _stream_json_array(stmt)
 
 @app.route("/videos", methods=["POST"])
 @require_auth_frontend
 def add_video():
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     if not body or not all(k in body for k in ("url", "title", "filename")):
         return jsonify({"error": "missing fields"}), 400
     # upsert by filename
@@ -165,7 +401,7 @@ def add_video():
 @app.route("/videos", methods=["DELETE"])
 @require_auth_frontend
 def delete_video():
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     filename = body.get("filename")
     if not filename:
         return jsonify({"error": "filename required"}), 400
@@ -177,13 +413,20 @@ def delete_video():
     log_message(f"[VIDEO] deleted {filename}")
     return jsonify({"ok": True, "message": f"deleted {filename}"})
 
+# Alias do antigo /data (arquivo JSON): mesma API, agora sobre a tabela videos
+# (sem decorator de auth aqui: os handlers chamados já validam o token)
+@app.route("/data", methods=["GET", "POST", "DELETE"])
+def data_compat():
+    handler = {"GET": list_videos, "POST": add_video, "DELETE": delete_video}[request.method]
+    return handler()
+
 # -----------------------
 # Jobs endpoints
 # -----------------------
 @app.route("/jobs", methods=["POST"])
 @require_auth_frontend
 def create_job():
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     if not body or "payload" not in body:
         return jsonify({"error": "payload required"}), 400
     queue = body.get("queue", "solicitacao")
@@ -196,69 +439,132 @@ def create_job():
     log_message(f"[JOB] created id={job.id} queue={queue} owner={owner}")
     return jsonify({"ok": True, "id": job.id}), 201
 
-@app.route("/jobs", methods=["GET"])
+MAX_BULK_JOBS = 1000
+
+# Vários jobs numa requisição: um INSERT multi-values + um COMMIT
+@app.route("/jobs/bulk", methods=["POST"])
 @require_auth_frontend
-def list_jobs():
+def create_jobs_bulk():
+    body = request.get_json(force=True, cache=False)
+    items = body.get("jobs") if isinstance(body, dict) else None
+    if not items or not isinstance(items, list):
+        return jsonify({"error": "jobs list required"}), 400
+    if len(items) > MAX_BULK_JOBS:
+        return jsonify({"error": f"at most {MAX_BULK_JOBS} jobs per request"}), 400
+    # valida tudo antes de inserir: um item inválido rejeita o lote inteiro com 400
+    rows = []
+    for item in items:
+        if not isinstance(item, dict) or "payload" not in item:
+            return jsonify({"error": "payload required"}), 400
+        try:
+            max_retries = int(item.get("max_retries", 3))
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid max_retries"}), 400
+        rows.append({
+            "queue": item.get("queue", "solicitacao"),
+            "owner": item.get("owner"),
+            "payload": item["payload"],
+            "max_retries": max_retries,
+            "status": "pending",
+        })
+    ids = db.session.execute(insert(Job).returning(Job.id, sort_by_parameter_order=True), rows).scalars().all()
+    db.session.commit()
+    log_message(f"[JOB] bulk created {len(ids)} jobs")
+    return jsonify({"ok": True, "ids": ids}), 201
+
+def _filter_jobs(stmt):
     queue = request.args.get("queue")
     owner = request.args.get("owner")
     status = request.args.get("status")
-    q = Job.query
     if queue:
-        q = q.filter_by(queue=queue)
+        stmt = stmt.where(Job.queue == queue)
     if owner:
-        q = q.filter_by(owner=owner)
+        stmt = stmt.where(Job.owner == owner)
     if status:
-        q = q.filter_by(status=status)
-    jobs = q.order_by(Job.created_at.desc()).limit(200).all()
-    return jsonify([j.to_dict() for j in jobs])
+        stmt = stmt.where(Job.status == status)
+    return stmt
+
+@app.route("/jobs", methods=["GET"])
+@require_auth_frontend
+def list_jobs():
+    stmt = _filter_jobs(select(Job.__table__))
+    stmt = _paginate(stmt, Job.id, default_limit=200)
+    return _stream_json_array(stmt)
+
+# Export sem limite (dashboards): NDJSON com cursor no servidor, memória limitada ao bloco
+@app.route("/jobs/stream", methods=["GET"])
+@require_auth_frontend
+def stream_jobs():
+    stmt = _filter_jobs(select(Job.__table__))
+    since = request.args.get("since")  # ISO 8601, filtra por updated_at >= since
+    if since:
+        try:
+            stmt = stmt.where(Job.updated_at >= datetime.fromisoformat(since))
+        except ValueError:
+            return jsonify({"error": "invalid since"}), 400
+    stmt = stmt.order_by(Job.id.asc()).execution_options(stream_results=True, yield_per=STREAM_EXPORT_ROWS)
+
+    def generate():
+        for rows in db.session.execute(stmt).mappings().partitions():
+            yield b"".join(_json_dumps(dict(r), option=orjson.OPT_APPEND_NEWLINE) for r in rows)
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 @app.route("/jobs/<int:job_id>", methods=["GET"])
 @require_auth_frontend
 def get_job(job_id):
-    job = Job.query.get(job_id)
-    if not job:
-        return jsonify({"error": "not found"}), 404
-    return jsonify(job.to_dict())
+    with _job_cache_lock:
+        cached = JOB_CACHE.get(job_id)
+    if cached is None:
+        job = Job.query.get(job_id)
+        if not job:
+            return jsonify({"error": "not found"}), 404
+        cached = _json_dumps(job.to_dict())
+        with _job_cache_lock:
+            JOB_CACHE[job_id] = cached
+    return Response(cached, mimetype="application/json")
+
+# Claim atômico em 1 round trip: escolhe + trava + atualiza + devolve a linha
+CLAIM_SQL = text("""
+    UPDATE jobs SET status = 'processing', worker_id = :worker_id, attempts = attempts + 1, updated_at = now()
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE queue = :queue AND status = 'pending'
+        ORDER BY created_at ASC
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+""")
+
+# CockroachDB: SKIP LOCKED sob isolamento serializable trava o range inteiro
+# e gera retries; o UPDATE com ORDER BY/LIMIT já é atômico por si só
+CLAIM_SQL_COCKROACH = text("""
+    UPDATE jobs SET status = 'processing', worker_id = :worker_id, attempts = attempts + 1, updated_at = now()
+    WHERE queue = :queue AND status = 'pending'
+    ORDER BY created_at ASC
+    LIMIT 1
+    RETURNING *
+""")
 
 # Worker claim: atomically take a pending job for a queue
 @app.route("/jobs/claim", methods=["POST"])
 @require_auth_worker
 def claim_job():
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     queue = body.get("queue", "solicitacao")
     worker_id = body.get("worker_id", "worker-unknown")
 
-    engine = db.get_engine()
-    dialect = engine.dialect.name
+    dialect = db.engine.dialect.name
 
-    # If using Postgres, use SELECT FOR UPDATE SKIP LOCKED inside transaction
     if dialect in ("postgresql", "cockroachdb"):
-        with engine.begin() as conn:
-            row = conn.execute(
-                text("""
-                SELECT id FROM jobs
-                WHERE queue = :queue AND status = 'pending'
-                ORDER BY created_at ASC
-                FOR UPDATE SKIP LOCKED
-                LIMIT 1
-                """), {"queue": queue}
-            ).fetchone()
-            if not row:
-                return ("", 204)
-            job_id = row[0]
-            conn.execute(
-                text("""
-                UPDATE jobs SET status = 'processing', worker_id = :worker_id, attempts = attempts + 1, updated_at = now()
-                WHERE id = :jid
-                """), {"worker_id": worker_id, "jid": job_id}
-            )
-            # select updated row to return
-            new_row = conn.execute(text("SELECT * FROM jobs WHERE id = :jid"), {"jid": job_id}).fetchone()
-            # convert row to dict (SQLAlchemy rowproxy -> mapping)
-            # We will load job via ORM for convenience
-            job = Job.query.get(job_id)
-            log_message(f"[JOB] claimed id={job_id} by {worker_id}")
-            return jsonify(job.to_dict())
+        claim_sql = CLAIM_SQL_COCKROACH if dialect == "cockroachdb" else CLAIM_SQL
+        row = db.session.execute(claim_sql, {"queue": queue, "worker_id": worker_id}).mappings().first()
+        db.session.commit()
+        if not row:
+            return ("", 204)
+        _invalidate_job(row["id"])
+        log_message(f"[JOB] claimed id={row['id']} by {worker_id}")
+        return jsonify(dict(row))
     else:
         # Fallback (SQLite or others) — not truly atomic but ok for local testing
         job = Job.query.filter_by(queue=queue, status="pending").order_by(Job.created_at.asc()).with_for_update(read=False).first()
@@ -269,71 +575,92 @@ def claim_job():
         job.attempts = job.attempts + 1
         job.updated_at = datetime.utcnow()
         db.session.commit()
+        _invalidate_job(job.id)
         log_message(f"[JOB] claimed id={job.id} by {worker_id} (fallback)")
         return jsonify(job.to_dict())
 
 @app.route("/jobs/<int:job_id>/progress", methods=["POST"])
 @require_auth_worker
 def job_progress(job_id):
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     progress = body.get("progress")
     message = body.get("message")
-    job = Job.query.get(job_id)
-    if not job:
-        return jsonify({"error": "not found"}), 404
     if progress is not None:
-        job.progress = int(progress)
-    if message:
-        existing = job.result or {}
-        logs = existing.get("logs", [])
-        logs.append({"ts": datetime.utcnow().isoformat(), "msg": message})
-        existing["logs"] = logs
-        job.result = existing
-    job.updated_at = datetime.utcnow()
-    db.session.commit()
-    return jsonify({"ok": True})
+        progress = int(progress)
+    try:
+        _progress_queue.put_nowait((job_id, progress, message, datetime.utcnow()))
+    except Full:
+        return jsonify({"error": "progress queue full, retry later"}), 503
+    return jsonify({"ok": True, "queued": True}), 202
+
+# UPDATE direto (Core) — evita SELECT + materializar o objeto ORM só para mudar 3 colunas
+STMT_COMPLETE = text("""
+    UPDATE jobs SET status = 'completed', progress = 100, result = :result, updated_at = :now
+    WHERE id = :jid
+""").bindparams(bindparam("result", type_=db.JSON))
+
+STMT_FAIL = text("""
+    UPDATE jobs SET status = 'failed', result = :result, updated_at = :now
+    WHERE id = :jid
+""").bindparams(bindparam("result", type_=db.JSON))
 
 @app.route("/jobs/<int:job_id>/complete", methods=["POST"])
 @require_auth_worker
 def job_complete(job_id):
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     result = body.get("result", {})
-    job = Job.query.get(job_id)
-    if not job:
-        return jsonify({"error": "not found"}), 404
-    job.status = "completed"
-    job.progress = 100
-    job.result = result
-    job.updated_at = datetime.utcnow()
+    updated = db.session.execute(
+        STMT_COMPLETE, {"result": result, "now": datetime.utcnow(), "jid": job_id}
+    ).rowcount
     db.session.commit()
+    if not updated:
+        return jsonify({"error": "not found"}), 404
+    _invalidate_job(job_id)
     log_message(f"[JOB] completed id={job_id}")
     return jsonify({"ok": True})
 
 @app.route("/jobs/<int:job_id>/fail", methods=["POST"])
 @require_auth_worker
 def job_fail(job_id):
-    body = request.get_json(force=True)
+    body = request.get_json(force=True, cache=False)
     error = body.get("error", "unknown error")
-    job = Job.query.get(job_id)
-    if not job:
-        return jsonify({"error": "not found"}), 404
-    job.status = "failed"
-    job.result = {"error": error}
-    job.updated_at = datetime.utcnow()
+    updated = db.session.execute(
+        STMT_FAIL, {"result": {"error": error}, "now": datetime.utcnow(), "jid": job_id}
+    ).rowcount
     db.session.commit()
+    if not updated:
+        return jsonify({"error": "not found"}), 404
+    _invalidate_job(job_id)
     log_message(f"[JOB] failed id={job_id}: {error}")
     return jsonify({"ok": True})
 
 # -----------------------
 # Logs endpoint
 # -----------------------
+LOGS_DEFAULT_TAIL = 500
+
+def _tail_lines(path, n):
+    # lê só o final do arquivo: varre de trás pra frente até achar n quebras de linha
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or n <= 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # só o "\n" final é terminador (não uma linha vazia); linhas em branco no meio contam
+            end = size - 1 if mm[size - 1:size] == b"\n" else size
+            pos = end
+            for _ in range(n):
+                pos = mm.rfind(b"\n", 0, pos)
+                if pos < 0:
+                    break
+            return mm[pos + 1:end].decode("utf-8", errors="replace").split("\n")
+
 @app.route("/logs", methods=["GET"])
 @require_auth_frontend
 def get_logs():
+    tail = request.args.get("tail", LOGS_DEFAULT_TAIL, type=int)
     try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return jsonify({"logs": content.splitlines()})
+        return jsonify({"logs": _tail_lines(log_path, tail)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -347,6 +674,7 @@ def debug_token():
 # -----------------------
 # MAIN
 # -----------------------
+# Servidor de desenvolvimento; em produção use wsgi.py com gunicorn -k gevent (ver Dockerfile)
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,6 @@
+# wsgi.py — entrypoint de produção (gunicorn + workers gevent)
+# psycopg2 é extensão C: sem este patch ele bloqueia o worker inteiro em cada query
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from app import app as application  # noqa: E402